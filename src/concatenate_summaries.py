@@ -1,5 +1,62 @@
 import os
-import glob
+import errno
+from collections import deque
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+READ_WORKERS = 8    # Threads reading summary files concurrently
+MAX_IN_FLIGHT = 16  # Files read ahead of the writer (bounds memory use)
+SEPARATOR = b"\n\n"  # Blank lines between files
+
+# copy_file_range errors meaning "not supported here" (old kernel, cross-device
+# on pre-5.3 kernels, filesystems without support) rather than a real I/O failure
+COPY_FILE_RANGE_UNSUPPORTED = {errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP}
+
+def read_ahead(executor, paths, window=MAX_IN_FLIGHT):
+    """
+    Yield the bytes of each file in `paths`, in order, while up to `window`
+    later files are already being read by the executor's threads.
+    """
+    pending = deque()
+    for path in paths:
+        pending.append(executor.submit(Path(path).read_bytes))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def concatenate_copy_file_range(md_files, output_path):
+    """
+    Concatenate with os.copy_file_range (Linux 4.5+): the kernel copies each
+    file straight into the output, so the data never passes through Python.
+    """
+    out_fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        for md_file in md_files:
+            in_fd = os.open(md_file, os.O_RDONLY)
+            try:
+                size = remaining = os.fstat(in_fd).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(in_fd, out_fd, remaining)
+                    if copied == 0:
+                        # Some filesystems signal "unsupported" by copying nothing
+                        # at all; only a 0 after some progress means the file shrank
+                        if remaining == size:
+                            raise OSError(errno.EOPNOTSUPP, "copy_file_range copied no data", md_file)
+                        break
+                    remaining -= copied
+            finally:
+                os.close(in_fd)
+            os.write(out_fd, SEPARATOR)
+    finally:
+        os.close(out_fd)
+
+def concatenate_read_ahead(md_files, output_path):
+    """Read files in parallel as raw bytes; a single writer appends them in sorted order."""
+    with ThreadPoolExecutor(max_workers=READ_WORKERS) as executor, open(output_path, "wb") as outfile:
+        for content in read_ahead(executor, md_files):
+            outfile.write(content)
+            outfile.write(SEPARATOR)
 
 def concatenate_markdown_files():
     # Determine absolute path to the folder containing this script
@@ -8,8 +65,12 @@ def concatenate_markdown_files():
     # Construct path to ../data/llm_summaries (one level up from src)
     md_folder = os.path.join(script_dir, "..", "data", "llm_summaries")
     
-    # Pattern to find all .md files in the specified folder
-    md_files = glob.glob(os.path.join(md_folder, "*.md"))
+    # Find all .md files in the specified folder (scandir reads the directory
+    # entries and their types in one pass)
+    md_files = []
+    if os.path.isdir(md_folder):
+        with os.scandir(md_folder) as entries:
+            md_files = [entry.path for entry in entries if entry.name.endswith(".md") and entry.is_file()]
     md_files.sort()  # Sort file list for a predictable order (optional)
 
     if not md_files:
@@ -19,13 +80,16 @@ def concatenate_markdown_files():
     output_path = os.path.join(script_dir, "..", "data", "concatenated_summaries.txt")
     print(f"Writing all summaries to: {output_path}")
 
-    with open(output_path, "w", encoding="utf-8") as outfile:
-        for md_file in md_files:
-            with open(md_file, "r", encoding="utf-8") as infile:
-                content = infile.read()
-            
-            outfile.write(content)
-            outfile.write("\n\n")  # Add blank lines between files
+    # Zero-copy in the kernel where available, otherwise parallel reads + one writer
+    if hasattr(os, "copy_file_range"):
+        try:
+            concatenate_copy_file_range(md_files, output_path)
+        except OSError as e:
+            if e.errno not in COPY_FILE_RANGE_UNSUPPORTED:
+                raise
+            concatenate_read_ahead(md_files, output_path)
+    else:
+        concatenate_read_ahead(md_files, output_path)
 
     print("Done! All .md files have been concatenated.")
 
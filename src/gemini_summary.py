@@ -12,16 +12,28 @@ No logs, no usage token data, no results folder.
 
 import os
 import sys
+import json
+import hashlib
 import argparse
+import datetime
 from pathlib import Path
-from dotenv import load_dotenv
+from typing import TYPE_CHECKING
 
-import google.generativeai as genai
-from google.generativeai import types
+# google.generativeai (grpc/protobuf) and dotenv are imported inside the
+# functions that use them, so --help and argument errors return instantly
+if TYPE_CHECKING:
+    import google.generativeai as genai
 
 MODEL_NAME = "gemini-2.0-flash"
 MAX_OUTPUT_TOKENS = 4096  # Adjust as desired
 
+# Server-side prompt cache lifetime; must outlast the run (the cache is deleted when it finishes)
+PROMPT_CACHE_TTL = datetime.timedelta(hours=6)
+PROMPT_CACHE_MIN_TOKENS = 4096  # Gemini won't cache less; shorter prompts are sent with each request
+
+# Maps sha256(PDF bytes) -> Gemini File API name, so unchanged PDFs aren't re-uploaded
+FILE_CACHE_PATH = Path(__file__).resolve().parents[1] / "data" / ".gemini_file_cache.json"
+
 def load_prompt(prompt_path: Path) -> str:
     """Load the summarization prompt from a text file."""
     if not prompt_path.is_file():
@@ -33,23 +45,90 @@ def load_prompt(prompt_path: Path) -> str:
         sys.exit(1)
     return text
 
-def summarize_pdf(pdf_path: Path, prompt: str, output_dir: Path):
+def load_file_cache() -> dict:
+    """Load the sha256 -> uploaded file name map (empty if missing or unreadable)."""
+    try:
+        return json.loads(FILE_CACHE_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def save_file_cache(cache: dict):
+    """Write the file cache atomically (temp file + os.replace)."""
+    tmp_path = FILE_CACHE_PATH.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(cache, indent=2), encoding="utf-8")
+    os.replace(tmp_path, FILE_CACHE_PATH)
+
+def get_file_ref(pdf_path: Path, file_cache: dict):
+    """
+    Return an ACTIVE uploaded file for this PDF, reusing an earlier upload
+    of identical bytes when the server still has it, uploading otherwise.
+    """
+    import google.generativeai as genai
+
+    digest = hashlib.sha256(pdf_path.read_bytes()).hexdigest()
+
+    cached_name = file_cache.get(digest)
+    if cached_name:
+        try:
+            file_ref = genai.get_file(cached_name)
+            if file_ref.state.name == "ACTIVE":
+                return file_ref
+        except Exception:
+            pass  # Expired (files are kept for 48h) or deleted; upload again
+
+    file_ref = genai.upload_file(str(pdf_path), mime_type="application/pdf")
+    file_cache[digest] = file_ref.name
+    save_file_cache(file_cache)
+    return file_ref
+
+def has_summary(output_file: Path) -> bool:
+    """True if a non-empty summary has already been written."""
+    return output_file.is_file() and output_file.stat().st_size > 0
+
+def create_prompt_cache(prompt: str):
+    """
+    Cache the prompt server-side so each request only sends the PDF.
+    Returns None if the prompt is below the model's minimum cacheable size or
+    caching fails; the prompt is then sent with each request.
+    """
+    # A token is at least one character, so a prompt with fewer characters
+    # than the minimum can't qualify; skip the API calls entirely
+    if len(prompt) < PROMPT_CACHE_MIN_TOKENS:
+        return None
+
+    import google.generativeai as genai
+
+    try:
+        if genai.GenerativeModel(MODEL_NAME).count_tokens(prompt).total_tokens < PROMPT_CACHE_MIN_TOKENS:
+            return None
+        return genai.caching.CachedContent.create(model=MODEL_NAME, contents=[prompt], ttl=PROMPT_CACHE_TTL)
+    except Exception as e:
+        print(f"Prompt caching unavailable ({type(e).__name__}); sending the prompt with each request.")
+        return None
+
+def summarize_pdf(model: "genai.GenerativeModel", pdf_path: Path, prompt, output_dir: Path,
+                  file_cache: dict):
     """
     Upload the entire PDF to Gemini-2.0 Flash in one request,
     receive a single text summary. Save the summary to data/llm_summaries/<pdf_stem>.md.
+    Pass prompt=None when the model was built from a cached prompt.
     """
+    from google.generativeai import types
+
     pdf_stem = pdf_path.stem
     output_file = output_dir / f"{pdf_stem}.md"
 
-    # Create the GenerativeModel object
-    model = genai.GenerativeModel(model_name=MODEL_NAME)
+    # Skip PDFs that already have a non-empty summary
+    if has_summary(output_file):
+        print(f"Summary already exists: {output_file}, skipping.")
+        return
 
-    # Upload the PDF
-    file_ref = genai.upload_file(str(pdf_path))
+    # Upload the PDF (or reuse a cached upload)
+    file_ref = get_file_ref(pdf_path, file_cache)
 
     # Generate content
     response = model.generate_content(
-        [file_ref, prompt],
+        [file_ref, prompt] if prompt else [file_ref],
         generation_config=types.GenerationConfig(
             temperature=0.0,  # Make it deterministic if you prefer
             max_output_tokens=MAX_OUTPUT_TOKENS
@@ -78,33 +157,60 @@ def main():
     summaries_dir.mkdir(exist_ok=True, parents=True)
 
     # Load .env for GOOGLE_API_KEY
+    from dotenv import load_dotenv
     load_dotenv(root_dir / "config" / ".env")
     api_key = os.getenv("GOOGLE_API_KEY")
     if not api_key:
         print("Error: GOOGLE_API_KEY is not set in .env file.")
         sys.exit(1)
 
-    # Configure generative AI with your key
-    genai.configure(api_key=api_key)
-
     # Load summarization prompt
     prompt_path = root_dir / "src" / "prompt.txt"
     prompt_text = load_prompt(prompt_path)
 
-    # If the user provided a single PDF
+    # If the user provided a single PDF, summarize just that one
     if pdf_arg.lower() != "all":
         pdf_path = pdfs_dir / pdf_arg
         if not pdf_path.is_file():
             print(f"PDF not found: {pdf_path}")
             sys.exit(1)
-        summarize_pdf(pdf_path, prompt_text, summaries_dir)
-        return
+        pdf_files = [pdf_path]
+    else:
+        # Otherwise, summarize every PDF in data/pdfs
+        pdf_files = sorted(pdfs_dir.glob("*.pdf"))
+
+    # Only now pay for importing the SDK (grpc/protobuf)
+    import google.generativeai as genai
 
-    # Otherwise, summarize every PDF in data/pdfs
-    for pdf_file in sorted(pdfs_dir.glob("*.pdf")):
-        summarize_pdf(pdf_file, prompt_text, summaries_dir)
+    # Configure generative AI with your key
+    genai.configure(api_key=api_key)
 
-    print("Done summarizing all PDFs in data/pdfs/.")
+    # Shared model object, reused for every PDF. With several PDFs to summarize,
+    # the prompt is cached server-side once instead of being sent (and tokenized) per PDF
+    pending_count = sum(not has_summary(summaries_dir / f"{pdf_file.stem}.md") for pdf_file in pdf_files)
+    prompt_cache = create_prompt_cache(prompt_text) if pending_count > 1 else None
+    if prompt_cache:
+        model = genai.GenerativeModel.from_cached_content(prompt_cache)
+        request_prompt = None
+    else:
+        model = genai.GenerativeModel(model_name=MODEL_NAME)
+        request_prompt = prompt_text
+
+    file_cache = load_file_cache()
+
+    try:
+        for pdf_file in pdf_files:
+            summarize_pdf(model, pdf_file, request_prompt, summaries_dir, file_cache)
+    finally:
+        if prompt_cache:
+            # Don't let a failed cleanup hide an error from the loop above
+            try:
+                prompt_cache.delete()
+            except Exception as e:
+                print(f"Could not delete prompt cache ({type(e).__name__}); it expires on its own.")
+
+    if pdf_arg.lower() == "all":
+        print("Done summarizing all PDFs in data/pdfs/.")
     
 if __name__ == "__main__":
     main()
\ No newline at end of file
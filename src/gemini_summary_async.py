@@ -6,29 +6,85 @@ creating .md summaries in data/llm_summaries/<pdf_stem>.md.
 Usage:
   python gemini_summary_parallel.py --pdf mypaper.pdf
   python gemini_summary_parallel.py --pdf all
+  python gemini_summary_parallel.py --pdf all --batch-size 4
 
-- No logs beyond minimal prints.
+- Talks to the Gemini REST API directly with aiohttp on a single event loop.
+- Progress messages go through a queued logger; no log files.
 - No usage token data, no extra results folder.
 """
 
+from __future__ import annotations
+
 import os
 import sys
+import json
 import time
+import queue
+import random
+import hashlib
+import logging
+import logging.handlers
+import asyncio
 import argparse
+import email.utils
 from pathlib import Path
-from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING
+
+import orjson  # Faster JSON (de)serialization for API bodies
 
-import google.generativeai as genai
-from google.generativeai import types
+# aiohttp is imported (module-wide) once main() has checked its arguments and
+# inputs, and dotenv inside main(), so --help and argument errors return
+# without paying for the HTTP stack
+if TYPE_CHECKING:
+    import aiohttp
+
+try:
+    import uvloop  # Optional, faster event loop
+except ImportError:
+    uvloop = None
 
 MODEL_NAME = "gemini-2.0-flash"
 MAX_OUTPUT_TOKENS = 4096  # Adjust as desired
+MODEL_MAX_OUTPUT_TOKENS = 8192  # Hard output limit of the model, shared by all papers in a batch
+
+# Gemini REST endpoints (bypassing the synchronous google.generativeai SDK)
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com"
+GEMINI_UPLOAD_URL = f"{GEMINI_BASE_URL}/upload/v1beta/files"
+GEMINI_GENERATE_URL = f"{GEMINI_BASE_URL}/v1beta/models/{MODEL_NAME}:generateContent"
+GEMINI_CACHE_URL = f"{GEMINI_BASE_URL}/v1beta/cachedContents"
+GEMINI_COUNT_TOKENS_URL = f"{GEMINI_BASE_URL}/v1beta/models/{MODEL_NAME}:countTokens"
+
+# Server-side prompt cache lifetime; must outlast the run (the cache is deleted when it finishes)
+PROMPT_CACHE_TTL_SECONDS = 6 * 3600
+PROMPT_CACHE_MIN_TOKENS = 4096  # Gemini won't cache less; shorter prompts are sent with each request
+
+# Maps sha256(PDF bytes) -> Gemini File API name, so unchanged PDFs aren't re-uploaded
+FILE_CACHE_PATH = Path(__file__).resolve().parents[1] / "data" / ".gemini_file_cache.json"
 
 # Parallel settings
-MAX_WORKERS = 500            # Adjust concurrency as needed
-RETRY_LIMIT_SECONDS = 120  # 2 minutes total to keep retrying 429
-BACKOFF_SLEEP_SECONDS = 10  # Sleep time on 429 before retrying
+REQUESTS_PER_MINUTE = 2000    # Client-side cap on generateContent calls; match your quota tier (free tier: 15)
+UPLOAD_WORKERS = 8            # Concurrent PDF uploads (bandwidth-bound stage)
+GENERATE_WORKERS = 32         # Concurrent generateContent calls (model-bound stage)
+UPLOAD_QUEUE_SIZE = 4         # Uploaded PDFs allowed to wait for a free generate worker
+MAX_CONNECTIONS = 100         # Size of the shared TCP connection pool
+MAX_RETRIES = 6               # Attempts per request on 429 'Resource Exhausted'
+BACKOFF_BASE_SECONDS = 2      # Exponential backoff: base * 2**attempt (+ jitter) ...
+BACKOFF_CAP_SECONDS = 60      # ... capped at this many seconds
+MAX_BATCH_BYTES = 20 * 1024 * 1024  # Start a new batch once a batch's PDFs exceed this size
+LARGE_WRITE_THRESHOLD = 1 << 20  # Summaries larger than this (bytes) are written from a worker thread
+
+def start_logging() -> logging.handlers.QueueListener:
+    """
+    Route log records through a queue to a single background writer thread,
+    so workers never block on the stdout lock. Call .stop() to flush.
+    """
+    log_queue = queue.Queue(-1)
+    root = logging.getLogger()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(logging.INFO)
+    listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler(sys.stdout))
+    listener.start()
+    return listener
 
 def load_prompt(prompt_path: Path) -> str:
     """Load the summarization prompt from a text file."""
@@ -41,65 +97,536 @@ def load_prompt(prompt_path: Path) -> str:
         sys.exit(1)
     return text
 
-def summarize_pdf(pdf_path: Path, prompt: str, output_dir: Path):
+class RateLimiter:
     """
-    Upload the entire PDF to Gemini-2.0 Flash in one request.
-    Receive a single text summary. Save to data/llm_summaries/<pdf_stem>.md
+    Token bucket allowing at most `rpm` requests per minute.
+    Tokens refill continuously; acquire() waits until one is available.
     """
-    pdf_stem = pdf_path.stem
-    output_file = output_dir / f"{pdf_stem}.md"
 
-    # Create the GenerativeModel object
-    model = genai.GenerativeModel(model_name=MODEL_NAME)
+    def __init__(self, rpm: int):
+        self.rpm = rpm
+        self.tokens = float(rpm)
+        self.refill_interval = 60.0 / rpm  # Seconds per token
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
 
-    # Upload the PDF
-    file_ref = genai.upload_file(str(pdf_path))
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.rpm, self.tokens + (now - self.updated) / self.refill_interval)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) * self.refill_interval)
 
-    # Generate content
-    response = model.generate_content(
-        [file_ref, prompt],
-        generation_config=types.GenerationConfig(
-            temperature=0.0,  # Make it deterministic if you prefer
-            max_output_tokens=MAX_OUTPUT_TOKENS
-        )
+def _is_rate_limit(e: Exception) -> bool:
+    """True for HTTP 429 'Resource Exhausted' responses."""
+    return isinstance(e, aiohttp.ClientResponseError) and e.status == 429
+
+def _parse_retry_after(e: aiohttp.ClientResponseError):
+    """Return the server's Retry-After delay in seconds, or None if absent/unparseable."""
+    value = e.headers.get("Retry-After") if e.headers else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+def load_file_cache() -> dict:
+    """Load the sha256 -> uploaded file name map (empty if missing or unreadable)."""
+    try:
+        return json.loads(FILE_CACHE_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def save_file_cache(cache: dict):
+    """Write the file cache atomically (temp file + os.replace)."""
+    tmp_path = FILE_CACHE_PATH.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(cache, indent=2), encoding="utf-8")
+    os.replace(tmp_path, FILE_CACHE_PATH)
+
+def _read_pdf(pdf_path: Path):
+    """Return the PDF bytes and their sha256 hex digest."""
+    pdf_bytes = pdf_path.read_bytes()
+    return pdf_bytes, hashlib.sha256(pdf_bytes).hexdigest()
+
+class EmptyResponseError(RuntimeError):
+    """Gemini answered without any text (no candidates, or blocked e.g. for SAFETY)."""
+
+async def _raise_for_status(resp: aiohttp.ClientResponse):
+    """
+    Like resp.raise_for_status(), but keeps Gemini's error message from the
+    JSON body instead of only the status line.
+    """
+    if resp.status < 400:
+        return
+    body = await resp.read()
+    try:
+        detail = orjson.loads(body)["error"]["message"]
+    except (ValueError, KeyError, TypeError):
+        detail = body.decode("utf-8", "replace").strip()[:500]
+    raise aiohttp.ClientResponseError(
+        resp.request_info,
+        resp.history,
+        status=resp.status,
+        message=f"{resp.reason}: {detail}" if detail else resp.reason,
+        headers=resp.headers,
     )
 
+async def get_uploaded_file(session: aiohttp.ClientSession, name: str):
+    """
+    Fetch a File API resource by name; None if it has expired or been deleted.
+    Other errors (429, 5xx) are raised, so with_retry backs off instead of the
+    PDF being uploaded again.
+    """
+    async with session.get(f"{GEMINI_BASE_URL}/v1beta/{name}") as resp:
+        if resp.status in (403, 404):
+            return None
+        await _raise_for_status(resp)
+        return orjson.loads(await resp.read())
+
+async def upload_pdf(session: aiohttp.ClientSession, display_name: str, pdf_bytes: bytes) -> dict:
+    """
+    Upload a PDF to the Gemini File API in a single multipart request.
+    Returns the file resource (name, uri, mimeType, ...).
+    """
+    with aiohttp.MultipartWriter("related") as mpwriter:
+        mpwriter.append_json({"file": {"display_name": display_name}})
+        mpwriter.append(pdf_bytes, {"Content-Type": "application/pdf"})
+
+    async with session.post(
+        GEMINI_UPLOAD_URL,
+        data=mpwriter,
+        headers={"X-Goog-Upload-Protocol": "multipart"},
+    ) as resp:
+        await _raise_for_status(resp)
+        body = orjson.loads(await resp.read())
+    return body["file"]
+
+async def get_file_ref(session: aiohttp.ClientSession, pdf_path: Path, file_cache: dict) -> dict:
+    """
+    Return an ACTIVE File API resource for this PDF, reusing an earlier upload
+    of identical bytes when the server still has it, uploading otherwise.
+    """
+    # Read and hash the whole PDF in one worker-thread dispatch so the event loop
+    # isn't blocked on disk I/O; the small summary write later stays synchronous
+    pdf_bytes, digest = await asyncio.to_thread(_read_pdf, pdf_path)
+
+    cached_name = file_cache.get(digest)
+    if cached_name:
+        file_ref = await get_uploaded_file(session, cached_name)
+        if file_ref and file_ref.get("state") == "ACTIVE":
+            return file_ref
+
+    file_ref = await upload_pdf(session, pdf_path.name, pdf_bytes)
+    file_cache[digest] = file_ref["name"]  # Saved once the run finishes
+    return file_ref
+
+async def create_prompt_cache(session: aiohttp.ClientSession, prompt: str):
+    """
+    Cache the prompt server-side so each request only sends the PDFs.
+    Returns the cachedContents name, or None if the prompt is below the model's
+    minimum cacheable size or caching fails; the prompt is then sent with each
+    request.
+    """
+    # A token is at least one character, so a prompt with fewer characters
+    # than the minimum can't qualify; skip the API calls entirely
+    if len(prompt) < PROMPT_CACHE_MIN_TOKENS:
+        return None
+
+    contents = [{"role": "user", "parts": [{"text": prompt}]}]
+    payload = {
+        "model": f"models/{MODEL_NAME}",
+        "contents": contents,
+        "ttl": f"{PROMPT_CACHE_TTL_SECONDS}s",
+    }
+    # Caching is optional, so network errors here must not stop the run
+    try:
+        async with session.post(
+            GEMINI_COUNT_TOKENS_URL,
+            data=orjson.dumps({"contents": contents}),
+            headers={"Content-Type": "application/json"},
+        ) as resp:
+            if resp.status != 200:
+                logging.info(f"Could not count prompt tokens (HTTP {resp.status}); "
+                             "sending the prompt with each request.")
+                return None
+            if orjson.loads(await resp.read()).get("totalTokens", 0) < PROMPT_CACHE_MIN_TOKENS:
+                return None
+
+        async with session.post(
+            GEMINI_CACHE_URL,
+            data=orjson.dumps(payload),
+            headers={"Content-Type": "application/json"},
+        ) as resp:
+            if resp.status != 200:
+                logging.info(f"Prompt caching unavailable (HTTP {resp.status}); sending the prompt with each request.")
+                return None
+            return orjson.loads(await resp.read())["name"]
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError) as e:
+        logging.info(f"Prompt caching unavailable ({type(e).__name__}); sending the prompt with each request.")
+        return None
+
+async def delete_prompt_cache(session: aiohttp.ClientSession, name: str):
+    """
+    Delete a cached prompt so it stops accruing storage time. Failures are only
+    logged, so they never hide an error from the run itself.
+    """
+    try:
+        async with session.delete(f"{GEMINI_BASE_URL}/v1beta/{name}") as resp:
+            if resp.status != 200:
+                logging.warning(f"Could not delete prompt cache {name} (HTTP {resp.status}); it expires on its own.")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logging.warning(f"Could not delete prompt cache {name} ({type(e).__name__}); it expires on its own.")
+
+def _file_part(file_ref: dict) -> dict:
+    return {"file_data": {"mime_type": file_ref["mimeType"], "file_uri": file_ref["uri"]}}
+
+async def generate_content(session: aiohttp.ClientSession, parts: list, generation_config: dict,
+                           limiter: RateLimiter, cached_prompt: str | None = None) -> tuple:
+    """
+    Send one generateContent request and return (response text, finishReason).
+    With cached_prompt, the cached prompt is prepended server-side to `parts`.
+    Raises EmptyResponseError if the response has no text.
+    """
+    payload = {
+        "contents": [{"role": "user", "parts": parts}],
+        "generationConfig": {
+            "temperature": 0.0,  # Make it deterministic if you prefer
+            **generation_config,
+        },
+    }
+    if cached_prompt:
+        payload["cachedContent"] = cached_prompt
+    await limiter.acquire()
+    async with session.post(
+        GEMINI_GENERATE_URL,
+        data=orjson.dumps(payload),
+        headers={"Content-Type": "application/json"},
+    ) as resp:
+        await _raise_for_status(resp)
+        body = orjson.loads(await resp.read())
+
     # Extract text from the response
-    summary_text = response.text if (response and response.text) else ""
+    candidates = body.get("candidates") or []
+    if not candidates:
+        block_reason = body.get("promptFeedback", {}).get("blockReason", "unknown")
+        raise EmptyResponseError(f"No response candidates (blockReason: {block_reason})")
+    finish_reason = candidates[0].get("finishReason")
+    parts = candidates[0].get("content", {}).get("parts", [])
+    text = "".join(part.get("text", "") for part in parts)
+    if not text:
+        raise EmptyResponseError(f"Empty response (finishReason: {finish_reason})")
+    return text, finish_reason
+
+async def generate_summary(session: aiohttp.ClientSession, file_ref: dict, prompt: str,
+                           limiter: RateLimiter, cached_prompt: str | None = None) -> str:
+    """Ask Gemini for a summary of an uploaded file and return the response text."""
+    parts = [_file_part(file_ref)]
+    if not cached_prompt:
+        parts.append({"text": prompt})
+    summary_text, _ = await generate_content(
+        session,
+        parts,
+        {"maxOutputTokens": MAX_OUTPUT_TOKENS, "responseMimeType": "text/plain"},
+        limiter,
+        cached_prompt,
+    )
+    return summary_text
+
+async def generate_batch_summaries(session: aiohttp.ClientSession, pdf_paths: list, file_refs: list,
+                                   prompt: str, limiter: RateLimiter, cached_prompt: str | None = None) -> dict:
+    """
+    Summarize several uploaded PDFs with one generateContent call, using the same
+    prompt for each. Returns {pdf filename: summary text} for the papers the
+    model answered for, or None if the answer was empty, cut off at the output
+    limit or isn't a valid JSON array.
+    """
+    parts = []
+    for number, (pdf_path, file_ref) in enumerate(zip(pdf_paths, file_refs), start=1):
+        parts.append({"text": f"=== PAPER {number}: {pdf_path.name} ==="})
+        parts.append(_file_part(file_ref))
+    # With a cached prompt, the instructions already precede the papers
+    batch_instructions = (
+        f"Apply {'the instructions at the start' if cached_prompt else 'these instructions'} "
+        f"to each of the {len(pdf_paths)} papers above separately. "
+        "Return a JSON array with one object per paper, where 'filename' is the name given "
+        "in the paper's === PAPER === header and 'summary' is that paper's full summary."
+    )
+    parts.append({"text": batch_instructions if cached_prompt else f"{prompt}\n\n{batch_instructions}"})
 
-    # Save the summary
-    with open(output_file, "w", encoding="utf-8") as f:
-        f.write(summary_text)
+    try:
+        response_text, finish_reason = await generate_content(
+            session,
+            parts,
+            {
+                "maxOutputTokens": min(MODEL_MAX_OUTPUT_TOKENS, MAX_OUTPUT_TOKENS * len(pdf_paths)),
+                "responseMimeType": "application/json",
+                "responseSchema": {
+                    "type": "ARRAY",
+                    "items": {
+                        "type": "OBJECT",
+                        "properties": {"filename": {"type": "STRING"}, "summary": {"type": "STRING"}},
+                        "required": ["filename", "summary"],
+                    },
+                },
+            },
+            limiter,
+            cached_prompt,
+        )
+    except EmptyResponseError:
+        return None  # Possibly one blocked paper; splitting the batch isolates it
 
-    return output_file  # Return the path of the newly created .md
+    # All papers share one output budget, so a long batch can be cut off mid-array
+    if finish_reason == "MAX_TOKENS":
+        return None
+    try:
+        entries = orjson.loads(response_text)
+    except orjson.JSONDecodeError:
+        return None
+    if not isinstance(entries, list):
+        return None
 
-def summarize_pdf_with_retry(pdf_path: Path, prompt: str, output_dir: Path):
+    # Ignore entries that don't follow the schema
+    entries = [entry for entry in entries if isinstance(entry, dict) and isinstance(entry.get("summary"), str)]
+    names = {pdf_path.name for pdf_path in pdf_paths}
+    summaries = {entry["filename"]: entry["summary"] for entry in entries if entry.get("filename") in names}
+    # Fall back to answer order only if the model mangled every filename; with
+    # some names matched, the order can't be trusted and unmatched papers are
+    # left out (summarize_batch then summarizes them one by one)
+    if not summaries and len(entries) == len(pdf_paths):
+        summaries = {pdf_path.name: entry["summary"] for pdf_path, entry in zip(pdf_paths, entries)}
+    return summaries
+
+async def summarize_batch(session: aiohttp.ClientSession, pdf_paths: list, file_refs: list, prompt: str,
+                          limiter: RateLimiter, cached_prompt: str | None = None) -> dict:
     """
-    Wraps summarize_pdf with a simple retry loop for 429 'Resource Exhausted' errors.
+    Summarize a batch of uploaded PDFs and return {pdf filename: summary text or
+    the exception that stopped it}. If the batch answer is empty, cut off or unreadable,
+    the batch is split in half and each half is summarized on its own, down to
+    single-PDF requests; papers the model left out are summarized individually.
     """
-    start_time = time.time()
-    attempt = 1
-    while True:
+    if len(pdf_paths) == 1:
+        summary_text = await with_retry(
+            pdf_paths[0].name,
+            lambda: generate_summary(session, file_refs[0], prompt, limiter, cached_prompt),
+        )
+        return {pdf_paths[0].name: summary_text}
+
+    label = f"batch of {len(pdf_paths)}: {pdf_paths[0].name}..."
+    summaries = await with_retry(
+        label,
+        lambda: generate_batch_summaries(session, pdf_paths, file_refs, prompt, limiter, cached_prompt),
+    )
+    if summaries is None:
+        logging.warning(f"[{label}] Response was empty, cut off or unreadable; splitting the batch.")
+        middle = len(pdf_paths) // 2
+        groups = [(pdf_paths[:middle], file_refs[:middle]), (pdf_paths[middle:], file_refs[middle:])]
+        summaries = {}
+    else:
+        groups = [([pdf_path], [file_ref]) for pdf_path, file_ref in zip(pdf_paths, file_refs)
+                  if pdf_path.name not in summaries]
+
+    for group_paths, group_refs in groups:
         try:
-            output_file = summarize_pdf(pdf_path, prompt, output_dir)
-            return output_file
+            summaries.update(await summarize_batch(session, group_paths, group_refs, prompt, limiter, cached_prompt))
         except Exception as e:
-            msg = str(e)
-            # Check for 429 or resource-exhausted signals
-            if ("429" in msg or "RESOURCE_EXHAUSTED" in msg) and \
-               (time.time() - start_time < RETRY_LIMIT_SECONDS):
-                attempt += 1
-                print(f"[{pdf_path.name}] Got 429/Resource Exhausted. Backoff #{attempt}...")
-                time.sleep(BACKOFF_SLEEP_SECONDS)
-            else:
-                # Not a 429 or we ran out of time
+            summaries.update({pdf_path.name: e for pdf_path in group_paths})
+    return summaries
+
+def make_batches(pdf_files: list, batch_size: int) -> list:
+    """
+    Group PDFs into batches of up to `batch_size`, starting a new batch early
+    when the combined file size would exceed MAX_BATCH_BYTES.
+    """
+    batches = []
+    batch, batch_bytes = [], 0
+    for pdf_path in pdf_files:
+        size = pdf_path.stat().st_size
+        if batch and (len(batch) >= batch_size or batch_bytes + size > MAX_BATCH_BYTES):
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+        batch.append(pdf_path)
+        batch_bytes += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+async def save_summary(output_file: Path, summary_text: str):
+    """
+    Save a summary. Summaries are a few KB, where a plain write on the loop is
+    quicker than an executor round-trip (aiofiles measures ~2x slower for small
+    files); only very large outputs are handed to a worker thread.
+    """
+    data = summary_text.encode("utf-8")
+    if len(data) > LARGE_WRITE_THRESHOLD:
+        await asyncio.to_thread(output_file.write_bytes, data)
+    else:
+        output_file.write_bytes(data)
+
+async def with_retry(label: str, make_call):
+    """
+    Await make_call() and return its result. On 429 'Resource Exhausted' errors,
+    wait for Retry-After (or exponential backoff with jitter) and call again.
+    """
+    for attempt in range(MAX_RETRIES):
+        try:
+            return await make_call()
+        except Exception as e:
+            # Not a 429 or we ran out of attempts
+            if not _is_rate_limit(e) or attempt == MAX_RETRIES - 1:
                 raise
+            delay = _parse_retry_after(e)
+            if delay is None:
+                delay = min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt) + random.uniform(0, 1)
+            logging.warning(f"[{label}] Got 429/Resource Exhausted. Retrying in {delay:.1f}s "
+                            f"(attempt {attempt + 2}/{MAX_RETRIES})...")
+            await asyncio.sleep(delay)
+
+async def upload_worker(session: aiohttp.ClientSession, pending: asyncio.Queue, uploaded: asyncio.Queue,
+                        file_cache: dict):
+    """
+    Stage 1: take batches of PDFs from `pending`, upload them (or reuse cached
+    uploads) and hand (pdf_paths, file_refs) to the generate stage via `uploaded`.
+    """
+    while True:
+        try:
+            batch = pending.get_nowait()
+        except asyncio.QueueEmpty:
+            return  # All PDFs have been taken
+
+        async def upload_one(pdf_path: Path):
+            return await with_retry(pdf_path.name, lambda: get_file_ref(session, pdf_path, file_cache))
+
+        results = await asyncio.gather(*(upload_one(pdf_path) for pdf_path in batch), return_exceptions=True)
+        pdf_paths, file_refs = [], []
+        for pdf_path, result in zip(batch, results):
+            if isinstance(result, Exception):
+                logging.error(f"✖ {pdf_path.name} => Upload error: {result}")
+                continue
+            pdf_paths.append(pdf_path)
+            file_refs.append(result)
+        if pdf_paths:
+            await uploaded.put((pdf_paths, file_refs))
+
+async def generate_worker(session: aiohttp.ClientSession, uploaded: asyncio.Queue, prompt: str,
+                          output_dir: Path, limiter: RateLimiter, cached_prompt: str | None = None):
+    """
+    Stage 2: take uploaded batches from `uploaded`, generate their summaries and
+    save them to data/llm_summaries/<pdf_stem>.md. Stops on a None sentinel.
+    """
+    while True:
+        item = await uploaded.get()
+        if item is None:
+            return
+        pdf_paths, file_refs = item
+
+        try:
+            summaries = await summarize_batch(session, pdf_paths, file_refs, prompt, limiter, cached_prompt)
+        except Exception as e:
+            for pdf_path in pdf_paths:
+                logging.error(f"✖ {pdf_path.name} => Error: {e}")
+            continue
+
+        for pdf_path in pdf_paths:
+            summary_text = summaries.get(pdf_path.name)
+            if summary_text is None:
+                logging.error(f"✖ {pdf_path.name} => Error: no summary for this paper in the batch response")
+                continue
+            if isinstance(summary_text, Exception):
+                logging.error(f"✖ {pdf_path.name} => Error: {summary_text}")
+                continue
+            output_file = output_dir / f"{pdf_path.stem}.md"
+            # A failed write must not end the worker: the upload stage would then
+            # block forever on a full `uploaded` queue
+            try:
+                await save_summary(output_file, summary_text)
+            except Exception as e:
+                logging.error(f"✖ {pdf_path.name} => Error: {e}")
+                continue
+            logging.info(f"✔ {pdf_path.name} => Summary saved to: {output_file}")
+
+async def summarize_pdfs(session: aiohttp.ClientSession, pdf_files: list, prompt: str, output_dir: Path,
+                         limiter: RateLimiter, file_cache: dict, batch_size: int = 1):
+    """
+    Summarize PDFs with a two-stage pipeline, so the next PDFs upload while
+    earlier ones are being generated. Wall time is roughly the slower of the
+    two stages instead of their sum. With batch_size > 1, each generate call
+    covers up to batch_size PDFs.
+    """
+    # Skip PDFs that already have a non-empty summary
+    todo = []
+    for pdf_path in pdf_files:
+        output_file = output_dir / f"{pdf_path.stem}.md"
+        if output_file.is_file() and output_file.stat().st_size > 0:
+            logging.info(f"✔ {pdf_path.name} => Summary already exists: {output_file}")
+        else:
+            todo.append(pdf_path)
+
+    # With several requests to make, cache the prompt server-side once instead
+    # of sending (and having it tokenized) with every request
+    batches = make_batches(todo, batch_size)
+    cached_prompt = await create_prompt_cache(session, prompt) if len(batches) > 1 else None
 
-def main():
+    pending = asyncio.Queue()
+    for batch in batches:
+        pending.put_nowait(batch)
+    uploaded = asyncio.Queue(maxsize=UPLOAD_QUEUE_SIZE)
+
+    uploaders = [
+        asyncio.create_task(upload_worker(session, pending, uploaded, file_cache))
+        for _ in range(UPLOAD_WORKERS)
+    ]
+    generators = [
+        asyncio.create_task(generate_worker(session, uploaded, prompt, output_dir, limiter, cached_prompt))
+        for _ in range(GENERATE_WORKERS)
+    ]
+
+    async def stop_generators():
+        for _ in generators:
+            await uploaded.put(None)
+
+    tasks = [*uploaders, *generators]
+    try:
+        # Generate workers only return on a sentinel, so one that finishes while
+        # uploads are still running has crashed. Surface that instead of letting
+        # the uploaders wait forever on a full `uploaded` queue
+        running_uploaders = set(uploaders)
+        while running_uploaders:
+            done, _ = await asyncio.wait([*running_uploaders, *generators], return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()  # Re-raise a crashed worker's exception
+                if task in generators:
+                    raise RuntimeError("generate worker stopped before all uploads were queued")
+            running_uploaders -= done
+
+        # Once every upload is queued, tell each generate worker to stop. The
+        # sentinels go out from their own task so a crash here can't block them
+        tasks.append(asyncio.create_task(stop_generators()))
+        await asyncio.gather(*generators)
+    finally:
+        for task in tasks:
+            task.cancel()
+        if cached_prompt:
+            await delete_prompt_cache(session, cached_prompt)
+
+async def main():
     parser = argparse.ArgumentParser(description="Generate text summaries for PDFs using Gemini-2.0 Flash (Parallel).")
     parser.add_argument("--pdf", required=True, help="Either a specific PDF filename or 'all'")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Number of PDFs to summarize per Gemini request (default: 1)")
     args = parser.parse_args()
     pdf_arg = args.pdf
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
 
     # Setup directories
     root_dir = Path(__file__).resolve().parents[1]
@@ -108,54 +635,55 @@ def main():
     summaries_dir.mkdir(exist_ok=True, parents=True)
 
     # Load .env for GOOGLE_API_KEY
+    from dotenv import load_dotenv
     load_dotenv(root_dir / "config" / ".env")
     api_key = os.getenv("GOOGLE_API_KEY")
     if not api_key:
         print("Error: GOOGLE_API_KEY is not set in .env file.")
         sys.exit(1)
 
-    # Configure generative AI with your key
-    genai.configure(api_key=api_key)
-
     # Load summarization prompt
     prompt_path = root_dir / "src" / "prompt.txt"
     prompt_text = load_prompt(prompt_path)
 
-    # If the user provided a single PDF, do a single summary (no parallel needed)
+    # If the user provided a single PDF, summarize just that one
     if pdf_arg.lower() != "all":
         pdf_path = pdfs_dir / pdf_arg
         if not pdf_path.is_file():
             print(f"PDF not found: {pdf_path}")
             sys.exit(1)
-        try:
-            output_file = summarize_pdf_with_retry(pdf_path, prompt_text, summaries_dir)
-            print(f"Summary saved to: {output_file}")
-        except Exception as e:
-            print(f"Error summarizing {pdf_arg}: {e}")
-        return
+        pdf_files = [pdf_path]
+    else:
+        # Otherwise, summarize every PDF in data/pdfs in parallel
+        pdf_files = sorted(pdfs_dir.glob("*.pdf"))
+        if not pdf_files:
+            print(f"No PDF files found in {pdfs_dir}")
+            sys.exit(0)
+        print(f"Found {len(pdf_files)} PDFs. Summarizing in parallel "
+              f"(upload_workers={UPLOAD_WORKERS}, generate_workers={GENERATE_WORKERS})...")
 
-    # Otherwise, summarize every PDF in data/pdfs in parallel
-    pdf_files = sorted(pdfs_dir.glob("*.pdf"))
-    if not pdf_files:
-        print(f"No PDF files found in {pdfs_dir}")
-        sys.exit(0)
-
-    print(f"Found {len(pdf_files)} PDFs. Summarizing in parallel (max_workers={MAX_WORKERS})...")
-    futures = {}
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        for pdf_path in pdf_files:
-            fut = executor.submit(summarize_pdf_with_retry, pdf_path, prompt_text, summaries_dir)
-            futures[fut] = pdf_path
-
-        for fut in as_completed(futures):
-            pdf_path = futures[fut]
-            try:
-                output_file = fut.result()
-                print(f"✔ {pdf_path.name} => Summary saved to: {output_file}")
-            except Exception as e:
-                print(f"✖ {pdf_path.name} => Error: {e}")
+    # One session (and connection pool) shared by every request; throughput is
+    # governed by the rate limiter, the worker counts only bound work in flight
+    limiter = RateLimiter(REQUESTS_PER_MINUTE)
+    file_cache = load_file_cache()
+    # Only now pay for importing the HTTP stack; the helpers above use it too
+    global aiohttp
+    import aiohttp
+
+    listener = start_logging()
+    try:
+        connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS, limit_per_host=MAX_CONNECTIONS)
+        async with aiohttp.ClientSession(connector=connector, headers={"x-goog-api-key": api_key}) as session:
+            await summarize_pdfs(session, pdf_files, prompt_text, summaries_dir, limiter, file_cache,
+                                 args.batch_size)
+    finally:
+        listener.stop()  # Flush queued messages before the final print
+        save_file_cache(file_cache)  # Also keeps the uploads of an interrupted run
 
-    print("Done summarizing all PDFs in data/pdfs/.")
+    if pdf_arg.lower() == "all":
+        print("Done summarizing all PDFs in data/pdfs/.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    asyncio.run(main())
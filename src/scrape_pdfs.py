@@ -4,12 +4,94 @@ Script 1: Scrape (download) PDFs from Excel links, saving them into data/pdfs/.
 No logs, no advanced error handling, minimal code.
 """
 
+from __future__ import annotations
+
 import os
 import sys
-import requests
-import openpyxl
 from pathlib import Path
 import re
+import shutil
+import email.utils
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING
+
+# requests and openpyxl are imported once we know there is work to do
+if TYPE_CHECKING:
+    import requests
+
+MAX_WORKERS = 16  # Parallel downloads
+HEAD_WORKERS = 32  # Parallel link checks (HEAD requests are cheap)
+PDF_CONTENT_TYPES = ("application/pdf", "application/octet-stream")
+CHUNK_SIZE = 1 << 16  # 64 KB copy buffer for streamed writes
+
+# Compiled once, reused for every row
+ARXIV_ABS_RE = re.compile(r'arxiv\.org/abs/([^/?#]+)')
+UNSAFE_FILENAME_RE = re.compile(r'[^\w\-_]')
+
+def make_session() -> requests.Session:
+    """Build one pooled session (with retries on transient errors) for all downloads."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=32,
+        pool_maxsize=32,
+        max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def _check_link(session: requests.Session, link: str):
+    """
+    HEAD the link, following redirects. Returns the final URL if it serves a PDF,
+    or None if the link is dead or points at something else (e.g. an HTML page).
+    """
+    resp = session.head(link, allow_redirects=True, timeout=10)
+    if resp.status_code in (405, 501):
+        return link  # Server doesn't support HEAD; let the GET decide
+    if not 200 <= resp.status_code < 300:
+        return None
+    if not resp.headers.get("Content-Type", "").startswith(PDF_CONTENT_TYPES):
+        return None
+    return resp.url
+
+def _download_one(session: requests.Session, link: str, pdf_path: Path):
+    """
+    Stream a single PDF to disk. If the file already exists, send a conditional
+    GET and return None when the server answers 304 Not Modified. The body is
+    written to a .part file first, so a failed download never clobbers a good copy.
+    """
+    headers = {}
+    if pdf_path.is_file():
+        headers["If-Modified-Since"] = email.utils.formatdate(pdf_path.stat().st_mtime, usegmt=True)
+
+    part_path = pdf_path.with_name(pdf_path.name + ".part")
+    try:
+        with session.get(link, headers=headers, timeout=60, stream=True) as resp:
+            if resp.status_code == 304:
+                return None
+            resp.raise_for_status()
+            resp.raw.decode_content = True  # Undo gzip/deflate transfer encoding
+            with open(part_path, "wb") as f:
+                shutil.copyfileobj(resp.raw, f, length=CHUNK_SIZE)
+            last_modified = resp.headers.get("Last-Modified")
+
+        # Stamp the file with the server's Last-Modified so the next
+        # If-Modified-Since compares against the server's own clock
+        if last_modified:
+            try:
+                mtime = email.utils.parsedate_to_datetime(last_modified).timestamp()
+                os.utime(part_path, (mtime, mtime))
+            except (TypeError, ValueError):
+                pass
+        os.replace(part_path, pdf_path)
+    except Exception:
+        part_path.unlink(missing_ok=True)
+        raise
+    return pdf_path
 
 def main():
     root_dir = Path(__file__).resolve().parents[1]
@@ -19,12 +101,22 @@ def main():
     # Create pdfs folder if not existing
     pdfs_dir.mkdir(exist_ok=True, parents=True)
 
-    # Load Excel
-    wb = openpyxl.load_workbook(excel_path)
+    if not excel_path.is_file():
+        print(f"Excel file not found: {excel_path}")
+        sys.exit(1)
+
+    import openpyxl
+
+    # Load Excel with the streaming reader (cell values only, no styles/formulas)
+    wb = openpyxl.load_workbook(excel_path, read_only=True, data_only=True)
     sheet = wb.active  # or wb['SheetName'] if you have a named sheet
+    # The streaming reader trusts the sheet's stored <dimension>, which some
+    # writers get wrong or omit; short rows are padded below
+    sheet.reset_dimensions()
+    rows = sheet.iter_rows(values_only=True)  # Single pass: header first, then data rows
 
     # Debugging: Print column headers to verify structure
-    first_row = list(next(sheet.iter_rows(values_only=True)))
+    first_row = list(next(rows))
     print(f"First row: {first_row}")
 
     # Determine column indices based on headers
@@ -36,20 +128,23 @@ def main():
     except ValueError as e:
         print(f"Error finding column headers: {e}")
         print("Make sure your Excel file has 'Title', 'Year', and 'Link' columns")
+        wb.close()
         return
 
+    # Reuse connections (and TLS handshakes) across downloads
+    session = make_session()
+
     download_count = 0
     skip_count = 0
+    downloads = {}  # pdf_path -> link, collected first and downloaded in parallel
 
-    # Iterate rows, skipping header row
-    for row_idx, row in enumerate(sheet.iter_rows(values_only=True), start=1):
-        if row_idx == 1:
-            continue  # skip header
-
-        # Make sure we have enough columns
-        if len(row) <= max(title_idx, year_idx, link_idx):
-            print(f"Row {row_idx} doesn't have enough columns: {row}")
-            continue
+    # Iterate the remaining (data) rows; the header was consumed above
+    needed_columns = max(title_idx, year_idx, link_idx) + 1
+    for row_idx, row in enumerate(rows, start=2):
+        # Rows stop at their last non-empty cell once dimensions are reset, so
+        # pad missing trailing cells with None (an empty Link is handled below)
+        if len(row) < needed_columns:
+            row = tuple(row) + (None,) * (needed_columns - len(row))
 
         title = row[title_idx]
         year = row[year_idx]
@@ -62,20 +157,19 @@ def main():
             continue
 
         # Transform arxiv links to PDF links
-        if "arxiv.org/abs/" in link:
-            # Extract the ID using regex
-            arxiv_id_match = re.search(r'arxiv\.org/abs/([^/]+)', link)
-            if arxiv_id_match:
-                arxiv_id = arxiv_id_match.group(1)
-                link = f"https://arxiv.org/pdf/{arxiv_id}.pdf"
-                print(f"Transformed to PDF link: {link}")
-
-        # Derive a filename from link and title
-        if link.split("/")[-1].strip() and '.' in link.split("/")[-1]:
-            filename = link.split("/")[-1]
+        arxiv_id_match = ARXIV_ABS_RE.search(link)
+        if arxiv_id_match:
+            arxiv_id = arxiv_id_match.group(1)
+            link = f"https://arxiv.org/pdf/{arxiv_id}.pdf"
+            print(f"Transformed to PDF link: {link}")
+
+        # Derive a filename from link and title (last path segment, query string dropped)
+        tail = link.rpartition("/")[2].split("?", 1)[0]
+        if tail.strip() and '.' in tail:
+            filename = tail
         else:
             # Use title as fallback if URL doesn't have a good filename
-            safe_title = re.sub(r'[^\w\-_]', '_', title if title else f"paper_{row_idx}")
+            safe_title = UNSAFE_FILENAME_RE.sub('_', title if title else f"paper_{row_idx}")
             filename = f"{safe_title}_{year}.pdf"
             
         if not filename.endswith(".pdf"):
@@ -83,25 +177,61 @@ def main():
 
         pdf_path = pdfs_dir / filename
 
-        # Skip download if already exists
-        if pdf_path.is_file():
+        # Skip download if already exists (or is already queued by an earlier row).
+        # Existing arXiv PDFs are queued anyway: arXiv honours If-Modified-Since,
+        # so an unchanged paper costs only a 304 response
+        is_arxiv = "arxiv.org/" in link
+        if pdf_path in downloads or (pdf_path.is_file() and not is_arxiv):
             print(f"Already have PDF: {filename}, skipping.")
             skip_count += 1
             continue
 
-        # Download the PDF
-        try:
-            print(f"Downloading {link} -> {filename}")
-            resp = requests.get(link, timeout=60)
-            resp.raise_for_status()
-
-            with open(pdf_path, "wb") as f:
-                f.write(resp.content)
-
-            print(f"Saved PDF: {pdf_path}")
-            download_count += 1
-        except Exception as e:
-            print(f"Error downloading from {link}: {e}")
+        downloads[pdf_path] = link
+
+    wb.close()  # Read-only workbooks keep the file open until closed
+
+    # Drop dead / non-PDF links and resolve redirects before downloading. PDFs
+    # we already have skip the HEAD; their conditional GET decides on its own
+    checked = {pdf_path: link for pdf_path, link in downloads.items() if pdf_path.is_file()}
+    with ThreadPoolExecutor(max_workers=HEAD_WORKERS) as executor:
+        futures = {
+            executor.submit(_check_link, session, link): pdf_path
+            for pdf_path, link in downloads.items()
+            if pdf_path not in checked
+        }
+        for fut in as_completed(futures):
+            pdf_path = futures[fut]
+            link = downloads[pdf_path]
+            try:
+                resolved = fut.result()
+            except Exception as e:
+                print(f"Error checking {link}: {e}")
+                resolved = None
+            if resolved is None:
+                print(f"Skipping dead or non-PDF link: {link}")
+                skip_count += 1
+                continue
+            checked[pdf_path] = resolved
+    downloads = checked
+
+    # Download the PDFs in parallel
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {}
+        for pdf_path, link in downloads.items():
+            print(f"Downloading {link} -> {pdf_path.name}")
+            futures[executor.submit(_download_one, session, link, pdf_path)] = pdf_path
+
+        for fut in as_completed(futures):
+            pdf_path = futures[fut]
+            try:
+                if fut.result() is None:
+                    print(f"Already have PDF: {pdf_path.name}, not modified, skipping.")
+                    skip_count += 1
+                    continue
+                print(f"Saved PDF: {pdf_path}")
+                download_count += 1
+            except Exception as e:
+                print(f"Error downloading from {downloads[pdf_path]}: {e}")
 
     print(f"Done. Downloaded {download_count} PDFs, skipped {skip_count}.")
 